@@ -1,16 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 import subprocess
 import sys
 
 def install_requirements():
-    """Install required Python packages using pip."""
+    """Install required Python packages using uv if available, falling back to pip."""
     print("Installing required Python packages...")
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-        print("Requirements installed successfully.")
+        # uv downloads and installs in parallel; it targets this interpreter's environment
+        subprocess.check_call(["uv", "pip", "install", "--python", sys.executable,
+                               "--compile-bytecode", "-r", "requirements.txt"])
+    except FileNotFoundError:
+        print("uv not found, falling back to pip...")
+        try:
+            subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+        except subprocess.CalledProcessError as e:
+            print(f"Failed to install requirements: {e}")
+            sys.exit(1)
     except subprocess.CalledProcessError as e:
-        print(f"Failed to install requirements: {e}")
+        print(f"Failed to install requirements with uv: {e}")
         sys.exit(1)
+    print("Requirements installed successfully.")
 
 def initialize_submodules():
     """Initialize and update the git submodules."""
@@ -26,7 +36,7 @@ def install_package():
     """Install the package in the current environment."""
     print("Installing the package...")
     try:
-        subprocess.check_call([sys.executable, "setup.py", "install"])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "."])
         print("Package installed successfully.")
     except subprocess.CalledProcessError as e:
         print(f"Failed to install the package: {e}")
@@ -34,15 +44,22 @@ def install_package():
 
 def main():
     """Run the installation process."""
-    if os.path.exists("requirements.txt"):
-        install_requirements()
-    else:
-        print("No requirements.txt file found. Skipping Python package installation.")
-
-    if os.path.isdir("src"):
-        initialize_submodules()
-    else:
-        print("No src directory found. Skipping submodule initialization.")
+    # Installing the requirements and fetching the submodules touch disjoint
+    # resources, so run them concurrently.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        jobs = []
+        if os.path.exists("requirements.txt"):
+            jobs.append(ex.submit(install_requirements))
+        else:
+            print("No requirements.txt file found. Skipping Python package installation.")
+
+        if os.path.isdir("src"):
+            jobs.append(ex.submit(initialize_submodules))
+        else:
+            print("No src directory found. Skipping submodule initialization.")
+
+        for job in jobs:
+            job.result()
 
     install_package()
 
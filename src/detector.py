@@ -1,17 +1,72 @@
 from abc import abstractmethod
 from collections.abc import Sequence
-import sys
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
 import time
-import clr
 import pyvisa as visa
 import numpy as np
 from ThorlabsPM100 import ThorlabsPM100
-from System import Array, Byte, Int64, Int32
-from TimeTag import TTInterface, Logic
 
-# Add Logic16 driver to the path (ensure it's the 64-bit version and permissions are granted)
-sys.path.append('.')
-clr.AddReference('.\\bin\\ttInterface.dll')
+# Logic16 driver (ensure it's the 64-bit version and permissions are granted)
+_TTINTERFACE_DLL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'bin', 'ttInterface.dll')
+TTInterface = Logic = Int32 = None
+
+def _ensure_timetag():
+    """
+    Load the .NET runtime and the Logic16 driver on first use, so that importing this
+    module (e.g. only for the PowerMeter) does not pay the CLR startup cost.
+    """
+    global TTInterface, Logic, Int32
+    if TTInterface is not None:
+        return
+    import clr
+    clr.AddReference(_TTINTERFACE_DLL)
+    from System import Int32
+    from TimeTag import TTInterface, Logic
+
+# A single VISA ResourceManager is shared by the whole module, since creating one
+# loads the VISA backend library and enumerates its drivers.
+@functools.lru_cache(maxsize=None)
+def get_resource_manager():
+    return visa.ResourceManager()
+
+# VISA enumeration results are reused for a short while, so that constructing
+# several detectors in a row does not rescan (and reopen) every resource.
+_VISA_CACHE_TTL = 10 # seconds
+_visa_cache_time = 0
+
+@functools.lru_cache(maxsize=1)
+def _enumerate_visa():
+    rm = get_resource_manager()
+
+    def probe(item):
+        try:
+            inst = rm.open_resource(item, open_timeout=500)
+            try:
+                return item, inst.query('*IDN?').strip()
+            finally:
+                inst.close()
+        except Exception as e:
+            print(f"Error querying VISA resource {item}: {e}")
+            return None
+
+    # The *IDN? queries are issued concurrently since each one blocks on the bus.
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        return tuple(r for r in ex.map(probe, rm.list_resources()) if r is not None)
+
+def enumerate_visa(refresh=False):
+    """
+    Return a tuple of (address, idn) pairs for all responding VISA resources.
+    Results are cached for _VISA_CACHE_TTL seconds unless `refresh` is True.
+    """
+    global _visa_cache_time
+    now = time.monotonic()
+    if refresh or now - _visa_cache_time > _VISA_CACHE_TTL:
+        _enumerate_visa.cache_clear()
+        _visa_cache_time = now
+    return _enumerate_visa()
 
 # Abstract base class for detectors
 class Detector:
@@ -25,20 +80,17 @@ class PowerMeter(Detector):
     def __init__(self, device_name):
         self.address = self.get_power_meter_address(device_name)
         self.pm = self.power_meter_init(wv=780)
+        # Instrument average count set by read(hardware_average=True), and the one it replaced
+        self._average_count = None
+        self._previous_average_count = None
 
     def get_power_meter_address(self, device_name):
         """
         Search for the power meter by device name and return its VISA address.
         """
-        rm = visa.ResourceManager()
-        for item in rm.list_resources():
-            try:
-                inst = rm.open_resource(item)
-                idn = inst.query('*IDN?').strip()
-                if device_name in idn:
-                    return item
-            except Exception as e:
-                print(f"Error querying VISA resource {item}: {e}")
+        for item, idn in enumerate_visa():
+            if device_name in idn:
+                return item
         print("Power meter not found.")
         return None
 
@@ -47,8 +99,7 @@ class PowerMeter(Detector):
         Initialize power meter and configure it to the specified wavelength.
         """
         if self.address:
-            rm = visa.ResourceManager()
-            inst = rm.open_resource(self.address)
+            inst = get_resource_manager().open_resource(self.address)
             power_meter = ThorlabsPM100(inst=inst)
             power_meter.configure.scalar.power()
             power_meter.sense.correction.wavelength = wv
@@ -56,27 +107,50 @@ class PowerMeter(Detector):
         print("Power meter address not found")
         return None
 
-    def read(self, power_samples=30):
+    def read(self, power_samples=30, hardware_average=False):
         """
         Read power samples, calculate average and return the mean.
+        If `hardware_average` is True, the averaging is done by the instrument
+        firmware (sense.average.count) and a single reading is queried instead.
         """
-        power = np.array([self.pm.read for i in range(power_samples)])
-        return power.mean()
+        pm = self.pm
+        if hardware_average:
+            if self._average_count != power_samples:
+                if self._previous_average_count is None:
+                    self._previous_average_count = int(pm.sense.average.count)
+                pm.sense.average.count = power_samples
+                self._average_count = power_samples
+            return float(pm.read)
+        if self._previous_average_count is not None:
+            # Put back the instrument's own averaging setting, which a hardware average replaced
+            pm.sense.average.count = self._previous_average_count
+            self._average_count = None
+            self._previous_average_count = None
+        power = np.empty(power_samples, dtype=np.float64)
+        for i in range(power_samples):
+            power[i] = pm.read
+        return float(power.mean())
+
 
+# Bit mask for each Logic16 input (1-16); index 0 is "no channel" and maps to an empty mask
+_CHANNEL_MASK = (0,) + tuple(1 << k for k in range(16))
+_CHANNEL_RANGE = range(len(_CHANNEL_MASK))
 
 # Helper function to convert channel to binary code
 def binary_code(channel):
     """
-    For use in Logic16
+    For use in Logic16. Channel 0 means "no channel" and maps to an empty mask.
     """
-    if isinstance(channel, Sequence):
-        return sum([binary_code(k) for k in channel])
-    else:
-        return 2**(channel-1)
+    if not isinstance(channel, int) and isinstance(channel, Sequence):
+        assert all(k in _CHANNEL_RANGE for k in channel)
+        return sum(_CHANNEL_MASK[k] for k in channel)
+    assert channel in _CHANNEL_RANGE
+    return _CHANNEL_MASK[channel]
 
 # Logic16 class for controlling UQDevices hardware
 class Logic16(Detector):
     def __init__(self, logic_mode=True):
+        _ensure_timetag()
         self.MyTagger = TTInterface()
         self.MyTagger.Open()
         self._resolution = self.MyTagger.GetResolution()
@@ -164,48 +238,94 @@ class Logic16(Detector):
         """
         return self.MyLogic.CalcCount(binary_code(pos), binary_code(neg))
 
-    def read_counts(self, pos_coincidence, pos_singles, neg_singles=[0]):
+    def _read_masked(self, c_masks, s_masks, n_masks, c_out=None, s_out=None):
         """
-        Reads the counts for singles and coincidences for the specified channels.
-        Returns the counts as arrays and the time counter value.
+        Reads the counts for already binary-encoded channel masks.
+        `n_masks` must have the same length as `c_masks`. The counts are written
+        in-place into `c_out`/`s_out` if given, otherwise new arrays are allocated.
         """
+        if c_out is None:
+            c_out = np.empty(len(c_masks), dtype=np.int64)
+        if s_out is None:
+            s_out = np.empty(len(s_masks), dtype=np.int64)
         self.MyLogic.ReadLogic()
         timecounter = self.MyLogic.GetTimeCounter()
 
-        counts_singles = [self.calc_single_count(pos, 0) for pos in pos_singles]
-        neg_singles = neg_singles * len(pos_coincidence) if len(neg_singles) == 1 else neg_singles
-        assert len(neg_singles) == len(pos_coincidence)
-        counts_coinc = [self.calc_single_count(pos, neg_singles[k]) for k, pos in enumerate(pos_coincidence)]
+        # The driver has no batched count call, so keep each interop crossing as cheap
+        # as possible: bind the methods once and use the one-argument CalcCountPos
+        # whenever there is no negative mask.
+        calc_count = self.MyLogic.CalcCount
+        calc_count_pos = self.MyLogic.CalcCountPos
+        for k, pos in enumerate(s_masks):
+            s_out[k] = calc_count_pos(pos)
+        for k, pos in enumerate(c_masks):
+            neg = n_masks[k]
+            c_out[k] = calc_count(pos, neg) if neg else calc_count_pos(pos)
+
+        return c_out, s_out, timecounter
+
+    def _channel_masks(self, pos_coincidence, pos_singles, neg_singles):
+        """
+        Binary-encodes the requested channels. If pos_coincidence/pos_singles are None,
+        the masks precomputed in set_channels are used.
+        """
+        if pos_coincidence is None:
+            c_masks = self._bcoincidences if self.coincidences is not None else []
+        else:
+            c_masks = [binary_code(pos) for pos in pos_coincidence]
+        s_masks = self._bsingles if pos_singles is None else [binary_code(pos) for pos in pos_singles]
+        n_masks = [binary_code(neg) for neg in neg_singles]
+        n_masks = n_masks * len(c_masks) if len(n_masks) == 1 else n_masks
+        assert len(n_masks) == len(c_masks)
+        return c_masks, s_masks, n_masks
 
-        return np.array(counts_coinc, dtype=int), np.array(counts_singles, dtype=int), timecounter
+    def read_counts(self, pos_coincidence=None, pos_singles=None, neg_singles=[0], c_out=None, s_out=None):
+        """
+        Reads the counts for singles and coincidences for the specified channels,
+        defaulting to the ones given to set_channels.
+        Returns the counts as arrays and the time counter value. Preallocated
+        integer arrays can be passed as `c_out`/`s_out` to be filled in-place.
+        """
+        return self._read_masked(*self._channel_masks(pos_coincidence, pos_singles, neg_singles),
+                                 c_out=c_out, s_out=s_out)
 
     def antilatch_check(self, singles_to_check):
         """
         Checks for latching events, both in the case of one detector latching (any) or all detectors latching (all). It is a good idea to differentiate between the two cases: if all detectors latch, it might be indicative of the cryostat being warm.
         """
-        check = [singles==0 for singles in singles_to_check]
-        return any(check) + all(check)
+        singles_to_check = np.asarray(singles_to_check)
+        zeros = np.count_nonzero(singles_to_check == 0)
+        return int(zeros > 0) + int(zeros == singles_to_check.size)
 
-    def read_counts_integrated(self, pos_coincidence, pos_singles, neg_singles=[0]):
+    def read_counts_integrated(self, pos_coincidence=None, pos_singles=None, neg_singles=[0]):
         """
         Reads integrated counts over a specified integration window.
         Handles antilatching by checking for repeated latch events and retrying if necessary.
         """
         iter = 0
         counting_time = 0
-        total_c_counts = np.zeros(len(pos_coincidence))
-        total_s_counts = np.zeros(len(pos_singles))
+        c_masks, s_masks, n_masks = self._channel_masks(pos_coincidence, pos_singles, neg_singles)
+        total_c_counts = np.zeros(len(c_masks))
+        total_s_counts = np.zeros(len(s_masks))
+        c_buf = np.empty(len(c_masks), dtype=np.int64)
+        s_buf = np.empty(len(s_masks), dtype=np.int64)
         has_latched = 0
         self.clear_buffer()
+        next_read = time.monotonic() + self._antilatch_timeslice
 
         # Instead of reading counts for the entire `counting_time` duration, which can be quite large,
         # read for a smaller integration time (we call this the "timeslice"). Doing this reduces the
         # chance of latching events messing up the photon counts.
+        # Reads are paced on a fixed monotonic schedule (the deadline advances by one timeslice
+        # before each read), so the time spent reading and processing a timeslice counts
+        # towards the next one instead of being added on top of it.
         while counting_time <= self._integration_window:
-            time.sleep(self._antilatch_timeslice)
-            c_counts, s_counts, timecounter = self.read_counts(pos_coincidence=pos_coincidence,
-                                                               pos_singles=pos_singles,
-                                                               neg_singles=neg_singles)
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_read += self._antilatch_timeslice
+            c_counts, s_counts, timecounter = self._read_masked(c_masks, s_masks, n_masks,
+                                                                 c_out=c_buf, s_out=s_buf)
             antilatch_flags = self.antilatch_check(s_counts)
             has_latched += antilatch_flags
 
@@ -215,12 +335,14 @@ class Logic16(Detector):
                 print('WARNING: several latching events in a row, waiting 1 min.')
                 has_latched = 0
                 time.sleep(60)
+                next_read = time.monotonic() + self._antilatch_timeslice
                 continue
             if antilatch_flags > 0:
                 self.antilatch_func()
                 print('.', end='') # Simple way to keep track of antilatch events
                 time.sleep(0.2)
                 self.clear_buffer()
+                next_read = time.monotonic() + self._antilatch_timeslice
                 continue
             else:
                 has_latched = 0
@@ -6,11 +6,17 @@ from scipy.interpolate import UnivariateSpline
 import time
 import pandas as pd
 
+# Variance of a unit gaussian truncated at its half maximum (|x| < sqrt(2 ln 2)), used by
+# Spectro._width_moments to recover sigma from the variance of the region above half max
+_HALF_MAX_VARIANCE_FRACTION = 0.3827
+
 class Spectro:
     def __init__(self, integration_time=100000):
         # Initialize the spectrometer and set integration time
         self.spec = Spectrometer.from_first_available()
         self.spec.integration_time_micros(integration_time)
+        # The wavelength axis is fixed for a given spectrometer, so fetch it only once
+        self._wavelengths = np.asarray(self.spec.wavelengths())
 
     def __del__(self):
         # Close the spectrometer connection when done
@@ -19,60 +25,100 @@ class Spectro:
     def filter_idx(self, w_min, w_max):
         """
         Filter the wavelengths within the specified range [w_min, w_max].
+        The wavelength axis is increasing, so the selection is stored as a slice (indexing returns a view).
         """
-        wavelengths = self.spec.wavelengths()
-        idx = np.where((w_min < wavelengths) & (wavelengths < w_max))
-        self.f = idx[0]
+        wavelengths = self._wavelengths
+        lo = np.searchsorted(wavelengths, w_min, side='right')
+        hi = np.searchsorted(wavelengths, w_max, side='left')
+        self.f = slice(lo, hi)
 
     @staticmethod
     def gauss(x, x0=0, sigma=1, a=1, b=0):
         return a * np.exp(-((x - x0) / sigma) ** 2) + b
 
     def FWHM(self, X, Y):
-        half_max = max(Y) / 2
-        d = np.sign(half_max - np.array(Y[:-1])) - np.sign(half_max - np.array(Y[1:]))
-        left_idx = np.where(d > 0)[0]
-        right_idx = np.where(d < 0)[-1]
-        return X[right_idx] - X[left_idx]
-
-    def get_width(self, w0, i0, method='fwhm'):
         """
-        Get the width of the spectral peak within the specified window. Two methods are available:
-        - 'spline'
-        - 'fwhm' on gaussian fit
+        Full width at half maximum of a single peak. X and Y must be ndarrays, and Y
+        must be monotone on each side of its maximum (e.g. a fitted gaussian).
         """
-        if method.lower() == 'spline':
-            # Using Univariate Spline to calculate the half-maximum and find roots
-            spline = UnivariateSpline(w0, i0 - np.max(i0) / 2, s=0)
-            roots = spline.roots()
-
-            # Check if roots were found, otherwise fall back to 'fwhm'
-            if len(roots) >= 2:
-                return roots[-1] - roots[0]
-            else:
-                print("Spline method failed to find valid roots, falling back to 'fwhm'.")
-                return self.get_width(w0=w0, i0=i0, method='fwhm')  # Fallback to 'fwhm' method
+        peak = np.argmax(Y)
+        half_max = Y[peak] / 2
+        # First sample at or above half max on the rising side, first one at or below it
+        # on the falling side; each crossing is linearly interpolated with its neighbour.
+        left_idx = np.searchsorted(Y[:peak], half_max)
+        right_idx = peak + np.searchsorted(-Y[peak:], -half_max)
+        if left_idx > 0:
+            left = np.interp(half_max, Y[left_idx-1:left_idx+1], X[left_idx-1:left_idx+1])
+        else:
+            left = X[0]
+        if right_idx < len(Y):
+            idx = [right_idx, right_idx - 1] # increasing Y for np.interp
+            right = np.interp(half_max, Y[idx], X[idx])
         else:
-            # Using Gaussian fit to calculate Full Width at Half Maximum (FWHM)
-            popt, _ = curve_fit(self.gauss, xdata=w0, ydata=i0, p0=[np.mean(w0), 2, max(i0), min(i0)])
-            w1 = np.linspace(w0[0], w0[-1], 100)
-            i1 = self.gauss(w1, *popt)
-            return self.FWHM(w1, i1)
+            right = X[-1]
+        return right - left
+
+    def _width_spline(self, w0, i0):
+        # Using Univariate Spline to calculate the half-maximum and find roots
+        spline = UnivariateSpline(w0, i0 - i0.max() / 2, s=0)
+        roots = spline.roots()
 
+        # Check if roots were found, otherwise fall back to 'fwhm'
+        if len(roots) >= 2:
+            return roots[-1] - roots[0]
+        print("Spline method failed to find valid roots, falling back to 'fwhm'.")
+        return self._width_fwhm(w0, i0)
 
+    def _width_fwhm(self, w0, i0):
+        # Using Gaussian fit to calculate Full Width at Half Maximum (FWHM)
+        popt, _ = curve_fit(self.gauss, xdata=w0, ydata=i0, p0=[np.mean(w0), 2, i0.max(), i0.min()])
+        w1 = np.linspace(w0[0], w0[-1], 100)
+        i1 = self.gauss(w1, *popt)
+        return self.FWHM(w1, i1)
+
+    def _width_moments(self, w0, i0):
+        # Second moment of the contiguous region above half maximum around the peak,
+        # after subtracting the baseline (median, as the line only covers a few pixels).
+        i = i0 - np.median(i0)
+        peak = i.argmax()
+        half_max = i[peak] / 2
+        if not half_max > 0:
+            print("Moments method found no peak above the baseline, falling back to 'fwhm'.")
+            return self._width_fwhm(w0, i0)
+        below = np.flatnonzero(i[:peak] <= half_max)
+        lo = below[-1] + 1 if below.size else 0
+        below = np.flatnonzero(i[peak:] <= half_max)
+        hi = peak + below[0] if below.size else len(i)
+        w, i = w0[lo:hi], i[lo:hi]
+        w_mean = np.average(w, weights=i)
+        var = np.average((w - w_mean) ** 2, weights=i)
+        # A gaussian truncated at half maximum keeps this fraction of its variance
+        return 2 * np.sqrt(2 * np.log(2) * var / _HALF_MAX_VARIANCE_FRACTION)
+
+    def get_width(self, w0, i0, method='fwhm'):
+        """
+        Get the width of the spectral peak within the specified window. Three methods are available:
+        - 'spline'
+        - 'fwhm' on gaussian fit (default, also available as 'gaussfit')
+        - 'moments', from the second moment of the peak above half maximum. Faster than the fit,
+          but only accurate to about half a pixel for narrow lines
+        """
+        width_methods = {'spline': self._width_spline, 'moments': self._width_moments}
+        return width_methods.get(method.lower(), self._width_fwhm)(w0, i0)
 
     def log_laser(self, window=[765, 785], method='fwhm'):
         """
         Log the central wavelength and amplitude of the laser within the specified window.
         """
         self.filter_idx(*window)
-        wavelengths = self.spec.wavelengths()
+        wavelengths = self._wavelengths
         intensities = self.spec.intensities()
         w0, i0 = wavelengths[self.f], intensities[self.f]
 
         # Find the central wavelength and amplitude
-        central_wv = w0[np.argmax(i0)]
-        amplitude = max(i0)
+        peak = i0.argmax()
+        central_wv = w0[peak]
+        amplitude = i0[peak]
         width = self.get_width(w0=w0,i0=i0,method=method)
 
         return dict(wavelength = central_wv, amplitude = amplitude, width=width)